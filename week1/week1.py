@@ -1,13 +1,12 @@
-n = int(input("Enter number of rows: "))
+import sys
 
-print("Lower Triangular Pattern:")
-for i in range(1, n + 1):
-    print("*" * i)
+n = int(input("Enter number of rows: "))
 
-print("\nUpper Triangular Pattern:")
-for i in range(n, 0, -1):
-    print("*" * i)
+lines = ["Lower Triangular Pattern:"]
+lines += ["*" * i for i in range(1, n + 1)]
+lines.append("\nUpper Triangular Pattern:")
+lines += ["*" * i for i in range(n, 0, -1)]
+lines.append("\nPyramid Pattern:")
+lines += [" " * (n - i) + "*" * (2 * i - 1) for i in range(1, n + 1)]
 
-print("\nPyramid Pattern:")
-for i in range(1, n + 1):
-    print(" " * (n - i) + "*" * (2 * i - 1))
\ No newline at end of file
+sys.stdout.write("\n".join(lines) + "\n")
\ No newline at end of file
@@ -1,53 +1,76 @@
 class Node:
+    __slots__ = ('data', 'next', 'prev')
+
     def __init__(self, data):
         self.data = data
         self.next = None
+        self.prev = None
 
 class LinkedList:
     def __init__(self):
         self.head = None
+        self.tail = None
+        self.length = 0
+        # Deleted nodes kept for reuse by add_node
+        self._pool = []
 
     def add_node(self, data):
-        new_node = Node(data)
+        if self._pool:
+            new_node = self._pool.pop()
+            new_node.data = data
+        else:
+            new_node = Node(data)
         if not self.head:
             self.head = new_node
+            self.tail = new_node
             print(f"Added {data} as the head node.")
         else:
-            current = self.head
-            while current.next:
-                current = current.next
-            current.next = new_node
+            new_node.prev = self.tail
+            self.tail.next = new_node
+            self.tail = new_node
             print(f"Added {data} to the end of the list.")
+        self.length += 1
 
     def print_list(self):
         if not self.head:
             print("The list is empty.")
         else:
+            values = []
             current = self.head
-            print("Linked List: ", end="")
             while current:
-                print(current.data, end=" -> ")
+                values.append(str(current.data))
                 current = current.next
-            print("None")
+            values.append("None")
+            print("Linked List: " + " -> ".join(values))
 
     def delete_nth_node(self, n):
         if not self.head:
             raise Exception("Cannot delete from an empty list.")
         if n <= 0:
             raise Exception("Invalid index. Please provide a positive integer.")
-        if n == 1:
-            print(f"Deleting node at position {n} with value {self.head.data}")
-            self.head = self.head.next
-            return
-        current = self.head
-        for i in range(n - 2):
-            if current.next is None:
-                raise Exception(f"Index {n} is out of range.")
-            current = current.next
-        if current.next is None:
+        if n > self.length:
             raise Exception(f"Index {n} is out of range.")
-        print(f"Deleting node at position {n} with value {current.next.data}")
-        current.next = current.next.next
+        # Walk from whichever end is closer to the target
+        if n <= self.length // 2:
+            current = self.head
+            for i in range(n - 1):
+                current = current.next
+        else:
+            current = self.tail
+            for i in range(self.length - n):
+                current = current.prev
+        print(f"Deleting node at position {n} with value {current.data}")
+        if current.prev:
+            current.prev.next = current.next
+        else:
+            self.head = current.next
+        if current.next:
+            current.next.prev = current.prev
+        else:
+            self.tail = current.prev
+        self.length -= 1
+        current.data = current.next = current.prev = None
+        self._pool.append(current)
 
 ll = LinkedList()
 
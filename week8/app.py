@@ -1,7 +1,8 @@
 import streamlit as st
 import os
-from legal_chatbot_main import LegalChatbot
 import time
+import html
+from pathlib import Path
 
 # Configure Streamlit page
 st.set_page_config(
@@ -47,12 +48,34 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource(show_spinner=False)
+def get_chatbot(_force_rebuild=False):
+    """Build the chatbot once per server process and share it across sessions"""
+    # Streamlit leaves underscore-prefixed arguments out of the cache key, so a
+    # forced rebuild still fills the one shared entry
+    from legal_chatbot_main import LegalChatbot
+    
+    chatbot = LegalChatbot()
+    chatbot.initialize(force_rebuild=_force_rebuild)
+    return chatbot
+
+@st.cache_data(ttl=30, show_spinner=False)
+def get_cache_size():
+    """Return the total size of the persisted index folder, refreshed every 30s"""
+    try:
+        if os.path.exists("./storage"):
+            total = sum(f.stat().st_size for f in Path("./storage").rglob("*") if f.is_file())
+            return f"{total / (1024*1024):.1f} MB"
+    except OSError:
+        pass
+    return "Unknown"
+
 def initialize_chatbot():
     """Initialize the chatbot with better progress feedback"""
     if 'chatbot' not in st.session_state:
         
         # Show different messages based on cache status
-        cache_exists = os.path.exists("./index_cache.pkl") and os.path.exists("./storage")
+        cache_exists = os.path.exists("./storage/documents_fingerprint.txt")
         
         if cache_exists:
             progress_text = "Loading cached index... This should be quick! ⚡"
@@ -64,15 +87,10 @@ def initialize_chatbot():
         
         try:
             with st.spinner(progress_text):
-                status_text.text("🔧 Initializing Mistral AI...")
+                status_text.text("📚 Initializing Mistral AI and processing legal documents...")
                 progress_bar.progress(20)
                 
-                chatbot = LegalChatbot()
-                
-                status_text.text("📚 Processing legal documents...")
-                progress_bar.progress(60)
-                
-                chatbot.initialize()
+                chatbot = get_chatbot()
                 
                 status_text.text("✅ Setting up query engine...")
                 progress_bar.progress(100)
@@ -99,9 +117,8 @@ def initialize_chatbot():
             if "cache" in str(e).lower():
                 if st.button("🔄 Try rebuilding index"):
                     try:
-                        chatbot = LegalChatbot()
-                        chatbot.rebuild_index()
-                        st.session_state.chatbot = chatbot
+                        get_chatbot.clear()
+                        st.session_state.chatbot = get_chatbot(_force_rebuild=True)
                         st.success("✅ Index rebuilt successfully!")
                         return True
                     except Exception as rebuild_error:
@@ -110,6 +127,18 @@ def initialize_chatbot():
             return False
     return True
 
+def render_message(message):
+    """Return the chat bubble HTML for a single chat history entry"""
+    content = html.escape(message['content'])
+    if message['role'] == 'user':
+        return f'<div class="chat-message user-message"><strong>You:</strong> {content}</div>'
+    # Keep line breaks in the bot's plain-text answer
+    clean_content = content.replace('\n', '<br>')
+    if 'processing_time_s' in message:
+        processing_time = f"⏱️ Response generated in {message['processing_time_s']:.1f} seconds"
+        clean_content += f'<br><br><small style="color: #666;">{processing_time}</small>'
+    return f'<div class="chat-message bot-message"><strong>Legal Assistant:</strong><br>{clean_content}</div>'
+
 def main():
     # Main header
     st.markdown("<h1 class='main-header'>⚖️ Indian Legal System Chatbot</h1>", unsafe_allow_html=True)
@@ -147,14 +176,7 @@ def main():
                     st.warning("Initialize chatbot first")
         
         with col2:
-            cache_size = "Unknown"
-            try:
-                if os.path.exists("./storage"):
-                    import shutil
-                    cache_size = f"{shutil.disk_usage('./storage')[1] / (1024*1024):.1f} MB"
-            except:
-                pass
-            st.metric("Cache Size", cache_size)
+            st.metric("Cache Size", get_cache_size())
         
         st.header("🔍 Search Capabilities")
         st.write("""
@@ -179,7 +201,8 @@ def main():
         return
     
     # Check if documents folder is empty
-    if not os.listdir("documents"):
+    # Hidden entries (e.g. a leftover cache folder) are not documents
+    if not any(not name.startswith('.') for name in os.listdir("documents")):
         st.warning("📁 Documents folder is empty! Please add legal documents to get started.")
         st.info("Supported formats: PDF, DOCX, TXT")
         return
@@ -200,22 +223,10 @@ def main():
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
     
-    # Display chat history with improved formatting
-    for message in st.session_state.chat_history:
-        if message['role'] == 'user':
-            st.markdown(f"""
-            <div class="chat-message user-message">
-                <strong>You:</strong> {message['content']}
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            # Clean message content for display
-            clean_content = message['content'].replace('\n', '<br>')
-            st.markdown(f"""
-            <div class="chat-message bot-message">
-                <strong>Legal Assistant:</strong><br>{clean_content}
-            </div>
-            """, unsafe_allow_html=True)
+    # Display chat history in a single markdown call
+    if st.session_state.chat_history:
+        history_html = "".join(render_message(message) for message in st.session_state.chat_history)
+        st.markdown(history_html, unsafe_allow_html=True)
     
     # Sample questions
     st.subheader("💡 Sample Questions")
@@ -264,45 +275,46 @@ def main():
         })
         
         # Display user message immediately
-        st.markdown(f"""
-        <div class="chat-message user-message">
-            <strong>You:</strong> {user_question}
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(render_message({'role': 'user', 'content': user_question}), unsafe_allow_html=True)
         
         # Generate response with better progress indication
         response_placeholder = st.empty()
         
-        with st.spinner("🔍 Analyzing legal documents and searching for information..."):
-            try:
-                start_time = time.time()
-                response = st.session_state.chatbot.query(user_question)
-                end_time = time.time()
-                
-                # Add bot response to chat history
-                st.session_state.chat_history.append({
-                    'role': 'assistant',
-                    'content': response
-                })
-                
-                # Display bot response with timing
-                processing_time = f"⏱️ Response generated in {end_time - start_time:.1f} seconds"
-                
-                clean_response = response.replace('\n', '<br>')
-                response_placeholder.markdown(f"""
-                <div class="chat-message bot-message">
-                    <strong>Legal Assistant:</strong><br>{clean_response}
-                    <br><br><small style="color: #666;">{processing_time}</small>
-                </div>
-                """, unsafe_allow_html=True)
-                
-            except Exception as e:
-                error_message = f"Sorry, I encountered an error: {str(e)}"
-                st.error(error_message)
-                st.session_state.chat_history.append({
-                    'role': 'assistant',
-                    'content': error_message
-                })
+        try:
+            start_time = time.perf_counter()
+            stream = st.session_state.chatbot.query_stream(user_question)
+            
+            # Retrieval and web search happen before the first token arrives
+            with st.spinner("🔍 Analyzing legal documents and searching for information..."):
+                parts = [next(stream, "")]
+            
+            # st.write_stream needs Streamlit 1.31+, so redraw the bubble as text arrives
+            for delta in stream:
+                parts.append(delta)
+                response_placeholder.markdown(
+                    render_message({'role': 'assistant', 'content': "".join(parts)}),
+                    unsafe_allow_html=True
+                )
+            end_time = time.perf_counter()
+            
+            # Add bot response to chat history, keeping the timing for later reruns
+            bot_message = {
+                'role': 'assistant',
+                'content': "".join(parts),
+                'processing_time_s': end_time - start_time
+            }
+            st.session_state.chat_history.append(bot_message)
+            
+            # Display bot response with timing
+            response_placeholder.markdown(render_message(bot_message), unsafe_allow_html=True)
+            
+        except Exception as e:
+            error_message = f"Sorry, I encountered an error: {str(e)}"
+            st.error(error_message)
+            st.session_state.chat_history.append({
+                'role': 'assistant',
+                'content': error_message
+            })
         
         # Rerun to update the display
         st.rerun()
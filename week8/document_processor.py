@@ -1,27 +1,93 @@
 import os
-import PyPDF2
-import docx2txt
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
 from llama_index.core import Document
 
+# Read size for streaming large text files
+TXT_CHUNK_SIZE = 1 << 20
+
 
 class DocumentProcessor:
     """Process various document formats for the legal chatbot"""
     
-    def __init__(self, documents_folder: str = "documents"):
+    def __init__(self, documents_folder: str = "documents", cache_folder: str = ".doc_cache"):
         self.documents_folder = documents_folder
         if not os.path.exists(documents_folder):
             os.makedirs(documents_folder)
+        # Kept outside the documents folder so it never shows up as a document
+        self.cache_folder = cache_folder
+        self._handlers = {
+            '.pdf': self.extract_text_from_pdf,
+            '.docx': self.extract_text_from_docx,
+            '.txt': self.extract_text_from_txt,
+        }
+    
+    def _cache_path(self, file_path: str) -> str:
+        """Return the cache file prefix for a document"""
+        key = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()
+        return os.path.join(self.cache_folder, key)
+    
+    def _load_cached_text(self, file_path: str, stat: os.stat_result):
+        """Return cached extracted text if the file is unchanged, else None"""
+        cache_path = self._cache_path(file_path)
+        try:
+            with open(cache_path + ".meta", 'r') as file:
+                meta = json.load(file)
+            if meta.get("mtime") != stat.st_mtime or meta.get("size") != stat.st_size:
+                return None
+            with open(cache_path + ".txt", 'r', encoding='utf-8') as file:
+                return file.read()
+        except (OSError, ValueError):
+            return None
+    
+    def _save_cached_text(self, file_path: str, stat: os.stat_result, text: str):
+        """Write extracted text and its stat fingerprint to the cache atomically"""
+        cache_path = self._cache_path(file_path)
+        try:
+            os.makedirs(self.cache_folder, exist_ok=True)
+            tmp_suffix = f".{os.getpid()}.tmp"
+            with open(cache_path + ".txt" + tmp_suffix, 'w', encoding='utf-8') as file:
+                file.write(text)
+            os.replace(cache_path + ".txt" + tmp_suffix, cache_path + ".txt")
+            with open(cache_path + ".meta" + tmp_suffix, 'w') as file:
+                json.dump({"mtime": stat.st_mtime, "size": stat.st_size}, file)
+            os.replace(cache_path + ".meta" + tmp_suffix, cache_path + ".meta")
+        except OSError as e:
+            print(f"Warning: Could not cache text for {file_path}: {str(e)}")
+    
+    def _prune_cache(self, file_paths: List[str]):
+        """Delete cached text for documents that are no longer in the folder"""
+        keep = {os.path.basename(self._cache_path(file_path)) for file_path in file_paths}
+        try:
+            with os.scandir(self.cache_folder) as entries:
+                for entry in entries:
+                    if entry.name.split('.', 1)[0] not in keep:
+                        os.remove(entry.path)
+        except OSError:
+            pass
     
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract text from PDF file"""
         try:
-            text = ""
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
+            import pypdfium2 as pdfium
+            
+            # Passing the path lets PDFium open and read the file natively,
+            # without copying it through a Python file buffer
+            pdf = pdfium.PdfDocument(pdf_path)
+            try:
+                parts = []
+                for page in pdf:
+                    textpage = page.get_textpage()
+                    parts.append(textpage.get_text_bounded())
+                    # Free each page's native objects now rather than at document close
+                    textpage.close()
+                    page.close()
+                return "\n".join(parts)
+            finally:
+                pdf.close()
         except Exception as e:
             print(f"Error reading PDF {pdf_path}: {str(e)}")
             return ""
@@ -29,6 +95,8 @@ class DocumentProcessor:
     def extract_text_from_docx(self, docx_path: str) -> str:
         """Extract text from DOCX file"""
         try:
+            import docx2txt
+            
             return docx2txt.process(docx_path)
         except Exception as e:
             print(f"Error reading DOCX {docx_path}: {str(e)}")
@@ -37,38 +105,58 @@ class DocumentProcessor:
     def extract_text_from_txt(self, txt_path: str) -> str:
         """Extract text from TXT file"""
         try:
-            with open(txt_path, 'r', encoding='utf-8') as file:
-                return file.read()
+            try:
+                parts = []
+                with open(txt_path, 'r', encoding='utf-8', buffering=TXT_CHUNK_SIZE) as file:
+                    for chunk in iter(lambda: file.read(TXT_CHUNK_SIZE), ''):
+                        parts.append(chunk)
+                return "".join(parts)
+            except UnicodeDecodeError:
+                # Legacy-encoded file: detect the encoding instead of dropping it
+                from charset_normalizer import from_path
+                best_match = from_path(txt_path).best()
+                if best_match is None:
+                    raise ValueError("could not detect encoding")
+                return str(best_match)
         except Exception as e:
             print(f"Error reading TXT {txt_path}: {str(e)}")
             return ""
     
-    def process_document(self, file_path: str) -> Document:
-        """Process a single document and return LlamaIndex Document object"""
-        file_extension = os.path.splitext(file_path)[1].lower()
-        file_name = os.path.basename(file_path)
-        
-        if file_extension == '.pdf':
-            text = self.extract_text_from_pdf(file_path)
-        elif file_extension == '.docx':
-            text = self.extract_text_from_docx(file_path)
-        elif file_extension == '.txt':
-            text = self.extract_text_from_txt(file_path)
-        else:
-            print(f"Unsupported file format: {file_extension}")
-            return None
-        
+    def _extract_text(self, file_path: str) -> str:
+        """Extract a document's text with its format handler and cache the result"""
+        handler = self._handlers[os.path.splitext(file_path)[1].lower()]
+        stat = os.stat(file_path)
+        text = handler(file_path)
+        if text.strip():
+            self._save_cached_text(file_path, stat, text)
+        return text
+    
+    def _make_document(self, file_path: str, text: str) -> Document:
+        """Wrap extracted text in a LlamaIndex Document, or None if it is empty"""
         if text.strip():
             return Document(
                 text=text,
                 metadata={
-                    "filename": file_name,
+                    "filename": os.path.basename(file_path),
                     "file_path": file_path,
                     "document_type": "legal_document"
                 }
             )
         return None
     
+    def process_document(self, file_path: str) -> Document:
+        """Process a single document and return LlamaIndex Document object"""
+        file_extension = os.path.splitext(file_path)[1].lower()
+        
+        if file_extension not in self._handlers:
+            print(f"Unsupported file format: {file_extension}")
+            return None
+        
+        text = self._load_cached_text(file_path, os.stat(file_path))
+        if text is None:
+            text = self._extract_text(file_path)
+        return self._make_document(file_path, text)
+    
     def process_all_documents(self) -> List[Document]:
         """Process all documents in the documents folder"""
         documents = []
@@ -77,13 +165,37 @@ class DocumentProcessor:
             print(f"Documents folder '{self.documents_folder}' not found!")
             return documents
         
-        for filename in os.listdir(self.documents_folder):
-            file_path = os.path.join(self.documents_folder, filename)
-            if os.path.isfile(file_path):
-                doc = self.process_document(file_path)
-                if doc:
-                    documents.append(doc)
-                    print(f"Processed: {filename}")
+        with os.scandir(self.documents_folder) as entries:
+            file_paths = [entry.path for entry in entries if entry.is_file()]
+        self._prune_cache(file_paths)
+        
+        # Serve unchanged files from the text cache; only misses need extracting
+        texts = {}
+        misses = []
+        for file_path in file_paths:
+            file_extension = os.path.splitext(file_path)[1].lower()
+            if file_extension not in self._handlers:
+                print(f"Unsupported file format: {file_extension}")
+                continue
+            text = self._load_cached_text(file_path, os.stat(file_path))
+            if text is None:
+                misses.append(file_path)
+            else:
+                texts[file_path] = text
+        
+        # Extraction is CPU-bound and independent per file, so fan out across cores
+        if misses:
+            max_workers = min(len(misses), os.cpu_count() or 1)
+            # Spawn rather than fork: forking the multi-threaded Streamlit server can
+            # hand workers a lock held by another thread and hang the rebuild
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                texts.update(zip(misses, executor.map(self._extract_text, misses)))
+        
+        for file_path in file_paths:
+            doc = self._make_document(file_path, texts[file_path]) if file_path in texts else None
+            if doc:
+                documents.append(doc)
+                print(f"Processed: {os.path.basename(file_path)}")
         
         print(f"Total documents processed: {len(documents)}")
-        return documents
\ No newline at end of file
+        return documents
@@ -1,11 +1,20 @@
 import os
-import pickle
+import re
+import asyncio
+import hashlib
+import threading
+import time
+import numpy as np
+import faiss
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
 import streamlit as st 
 from dotenv import load_dotenv
 from llama_index.core import VectorStoreIndex, Settings, StorageContext, load_index_from_storage
+from llama_index.core.schema import MetadataMode, QueryBundle
 from llama_index.core.storage.docstore import SimpleDocumentStore
 from llama_index.core.storage.index_store import SimpleIndexStore
-from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.vector_stores.faiss import FaissVectorStore
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.retrievers import VectorIndexRetriever
 from llama_index.core.response_synthesizers import get_response_synthesizer, ResponseMode
@@ -13,7 +22,7 @@ from llama_index.core.prompts import PromptTemplate
 from llama_index.embeddings.mistralai import MistralAIEmbedding
 from llama_index.llms.mistralai import MistralAI
 from document_processor import DocumentProcessor
-from web_scraper import WebScraper
+from web_scraper import WebScraper, compile_keywords
 import nest_asyncio
 
 # Apply nest_asyncio for Streamlit compatibility
@@ -22,6 +31,33 @@ nest_asyncio.apply()
 # Load environment variables
 load_dotenv()
 
+# Chunks sent per embedding request
+EMBED_BATCH_SIZE = 64
+# Mistral rejects embedding requests over 16384 tokens; the local tokenizer
+# only approximates Mistral's, so keep a safety margin
+EMBED_BATCH_TOKEN_LIMIT = 12000
+# Embedding requests allowed in flight at once
+EMBED_CONCURRENCY = 8
+# Answers kept for near-duplicate questions, and the cosine similarity
+# a new question needs to reuse one
+SEMANTIC_CACHE_SIZE = 256
+SEMANTIC_CACHE_THRESHOLD = 0.95
+# Seconds a cached answer stays valid
+SEMANTIC_CACHE_TTL = 86400
+# Tokens that must match exactly for a cached answer to be reused: numbers
+# ("21", "302A"), acronyms ("IPC", "CrPC") and provision words. Questions
+# about different provisions can otherwise embed almost identically
+_LEGAL_REF_RE = re.compile(r'\d+[A-Za-z]*|\b[A-Z][A-Za-z]*[A-Z]\b|(?i:\b(?:article|section|rule|order|schedule|clause)s?\b)')
+# Graph degree of the HNSW vector index
+HNSW_NEIGHBORS = 32
+# Characters of document context taken per retrieved node and in total
+DOC_CONTEXT_NODE_CHARS = 1500
+DOC_CONTEXT_MAX_CHARS = 6000
+# Prompts above this many tokens are logged
+PROMPT_TOKEN_WARN = 3000
+# Markdown emphasis and heading markers stripped from LLM answers
+_MD_RE = re.compile(r'[*#]+')
+
 
 class LegalChatbot:
     """Indian Legal System RAG Chatbot using LlamaIndex and Mistral - Optimized Version"""
@@ -33,7 +69,8 @@ class LegalChatbot:
         
         # Storage paths for caching
         self.storage_dir = "./storage"
-        self.index_cache_file = "./index_cache.pkl"
+        # Fingerprint of the documents the persisted index was built from
+        self.fingerprint_file = os.path.join(self.storage_dir, "documents_fingerprint.txt")
         
         # Initialize Mistral LLM and Embeddings with compatible versions
         try:
@@ -46,14 +83,15 @@ class LegalChatbot:
             
             self.embed_model = MistralAIEmbedding(
                 api_key=self.mistral_api_key,
-                model_name="mistral-embed"
+                model_name="mistral-embed",
+                embed_batch_size=EMBED_BATCH_SIZE
             )
             
         except Exception as e:
             print(f"Error with models, trying basic initialization: {e}")
             try:
                 self.llm = MistralAI(api_key=self.mistral_api_key)
-                self.embed_model = MistralAIEmbedding(api_key=self.mistral_api_key)
+                self.embed_model = MistralAIEmbedding(api_key=self.mistral_api_key, embed_batch_size=EMBED_BATCH_SIZE)
                 print("✅ Using basic initialization")
             except Exception as final_error:
                 raise ValueError(f"All initialization attempts failed. Please check your MISTRAL_API_KEY. Error: {final_error}")
@@ -66,8 +104,26 @@ class LegalChatbot:
         
         self.index = None
         self.query_engine = None
+        self.retriever = None
+        # (normalized question embedding, legal references, expiry time, answer)
+        # entries, least recently used first
+        self._sem_cache = []
+        # One instance is shared by every Streamlit session, which run in
+        # separate threads
+        self._sem_cache_lock = threading.Lock()
+        # Serializes rebuilds, which write the shared storage folder
+        self._rebuild_lock = threading.Lock()
+        # Bumped each time a rebuilt index is swapped in; answers computed
+        # against an older index are not cached
+        self._index_generation = 0
         self.document_processor = DocumentProcessor()
         self.web_scraper = WebScraper()
+        # Phrases like 'recent case' or 'new law' are already covered by their
+        # first word, since keywords only anchor at the start
+        self._web_search_re = compile_keywords([
+            'recent', 'latest', 'new', '2024', '2023', 'current', 'today',
+            'updated', 'now', 'present'
+        ])
         
         # Custom prompt template for legal queries with web context (Fixed formatting)
         self.legal_prompt_template = PromptTemplate(
@@ -93,33 +149,48 @@ class LegalChatbot:
             "Answer: "
         )
     
+    def _documents_fingerprint(self) -> str:
+        """Hash the name, size and mtime of every file in the documents folder"""
+        digest = hashlib.sha1()
+        with os.scandir(self.document_processor.documents_folder) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if entry.is_file():
+                    stat = entry.stat()
+                    digest.update(f"{entry.name}:{stat.st_size}:{int(stat.st_mtime)}\n".encode())
+        return digest.hexdigest()
+    
     def _documents_changed(self) -> bool:
         """Check if documents have been modified since last index build"""
-        if not os.path.exists(self.index_cache_file):
+        if not os.path.exists(self.fingerprint_file):
             return True
         
-        cache_time = os.path.getmtime(self.index_cache_file)
-        
-        # Check if any document is newer than cache
-        documents_dir = "documents"
-        if not os.path.exists(documents_dir):
+        if not os.path.exists(self.document_processor.documents_folder):
             return True
         
-        for filename in os.listdir(documents_dir):
-            file_path = os.path.join(documents_dir, filename)
-            if os.path.isfile(file_path) and os.path.getmtime(file_path) > cache_time:
-                return True
+        # Compare against the fingerprint saved with the cached index
+        with open(self.fingerprint_file, 'r') as f:
+            cached_fingerprint = f.read().strip()
         
-        return False
+        return cached_fingerprint != self._documents_fingerprint()
     
     def build_index(self, force_rebuild: bool = False):
         """Build the vector index from processed documents with caching"""
+        self.index = self._load_or_build_index(force_rebuild)
+        return self.index
+    
+    def _load_or_build_index(self, force_rebuild: bool = False) -> VectorStoreIndex:
+        """Return the cached index, or build and cache a new one, without touching self.index"""
         
         # Try to load existing index if documents haven't changed
         if not force_rebuild and not self._documents_changed():
-            if self.load_cached_index():
+            index = self.load_cached_index()
+            if index is not None:
                 print("✅ Loaded cached index - startup accelerated!")
-                return self.index
+                return index
+        
+        # Fingerprint before reading: a document edited during the build then
+        # leaves a stale fingerprint, which triggers a rebuild next start
+        fingerprint = self._documents_fingerprint()
         
         print("📄 Processing documents...")
         documents = self.document_processor.process_all_documents()
@@ -129,53 +200,103 @@ class LegalChatbot:
         
         print(f"🔍 Building vector index for {len(documents)} documents...")
         
+        # Chunk and embed up front so embeddings go out in large batches
+        nodes = Settings.node_parser.get_nodes_from_documents(documents, show_progress=True)
+        self._embed_nodes(nodes)
+        
+        # HNSW graph index: approximate nearest neighbour search instead of a full scan.
+        # Mistral embeddings are unit length, so inner product is cosine similarity
+        faiss_index = faiss.IndexHNSWFlat(len(nodes[0].embedding), HNSW_NEIGHBORS, faiss.METRIC_INNER_PRODUCT)
+        
         # Create storage context
         storage_context = StorageContext.from_defaults(
             docstore=SimpleDocumentStore(),
-            vector_store=SimpleVectorStore(),
+            vector_store=FaissVectorStore(faiss_index=faiss_index),
             index_store=SimpleIndexStore(),
         )
         
-        # Build index with progress bar
-        self.index = VectorStoreIndex.from_documents(
-            documents,
+        for doc in documents:
+            storage_context.docstore.set_document_hash(doc.get_doc_id(), doc.hash)
+        
+        # Nodes already carry embeddings, so the index does not re-embed them
+        index = VectorStoreIndex(
+            nodes=nodes,
             storage_context=storage_context,
             show_progress=True
         )
         
         # Cache the index
-        self.save_index_cache()
+        self.save_index_cache(index, fingerprint)
         print("✅ Index built and cached successfully!")
-        return self.index
+        return index
+    
+    def _embedding_batches(self, texts: List[str]) -> List[List[str]]:
+        """Split texts into batches bounded by count and by the request token limit"""
+        tokenizer = Settings.tokenizer
+        batches = []
+        batch, batch_tokens = [], 0
+        for text in texts:
+            text_tokens = len(tokenizer(text))
+            if batch and (len(batch) >= EMBED_BATCH_SIZE or batch_tokens + text_tokens > EMBED_BATCH_TOKEN_LIMIT):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += text_tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _embed_batches_threaded(self, batches: List[List[str]]) -> List[List[float]]:
+        """Embed batches concurrently, capped at EMBED_CONCURRENCY requests in flight"""
+        # Requests spend their time waiting on the network with the GIL released,
+        # and map() returns results in batch order
+        with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as executor:
+            results = executor.map(self.embed_model.get_text_embedding_batch, batches)
+            return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+    
+    def _embed_nodes(self, nodes):
+        """Embed node texts in token-bounded batches and attach the embeddings"""
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        print(f"🧮 Embedding {len(texts)} chunks...")
+        
+        # Use the sync client: the model's async client is bound to the event loop
+        # that first used it, and every asyncio.run() creates a new one
+        embeddings = self._embed_batches_threaded(self._embedding_batches(texts))
+        
+        for node, embedding in zip(nodes, embeddings):
+            node.embedding = embedding
     
-    def save_index_cache(self):
+    def save_index_cache(self, index: VectorStoreIndex, fingerprint: str):
         """Save index to cache for faster loading"""
         try:
             # Save index to storage directory
             if not os.path.exists(self.storage_dir):
                 os.makedirs(self.storage_dir)
             
-            self.index.storage_context.persist(self.storage_dir)
+            index.storage_context.persist(self.storage_dir)
             
-            # Create cache timestamp file
-            with open(self.index_cache_file, 'w') as f:
-                f.write("cached")
+            # Record which documents this index was built from
+            with open(self.fingerprint_file, 'w') as f:
+                f.write(fingerprint)
             
             print("💾 Index cached successfully")
         except Exception as e:
             print(f"⚠️ Warning: Could not cache index: {e}")
     
-    def load_cached_index(self) -> bool:
-        """Load index from cache"""
+    def load_cached_index(self):
+        """Load index from cache, or return None if there is no usable cache"""
         try:
             if os.path.exists(self.storage_dir):
-                storage_context = StorageContext.from_defaults(persist_dir=self.storage_dir)
-                self.index = load_index_from_storage(storage_context)
-                return True
+                vector_store = FaissVectorStore.from_persist_dir(self.storage_dir)
+                storage_context = StorageContext.from_defaults(
+                    vector_store=vector_store,
+                    persist_dir=self.storage_dir
+                )
+                return load_index_from_storage(storage_context)
         except Exception as e:
             print(f"⚠️ Could not load cached index: {e}")
         
-        return False
+        return None
     
     def setup_query_engine(self, similarity_top_k: int = 3):  # Reduced from 5 to 3
         """Setup the query engine with custom prompt"""
@@ -195,23 +316,20 @@ class LegalChatbot:
         )
         
         # Create query engine
-        self.query_engine = RetrieverQueryEngine(
+        query_engine = RetrieverQueryEngine(
             retriever=retriever,
             response_synthesizer=response_synthesizer,
         )
         
+        # Keep the retriever so query() can reuse it; both are swapped in only
+        # once built, so concurrent queries never see a half-built engine
+        self.retriever = retriever
+        self.query_engine = query_engine
         return self.query_engine
     
     def should_search_web(self, question: str) -> bool:
         """Determine if web search is needed for the query"""
-        web_search_keywords = [
-            'recent', 'latest', 'new', '2024', '2023', 'current', 'today',
-            'recent case', 'recent judgment', 'latest ruling', 'new law',
-            'current status', 'updated', 'now', 'present'
-        ]
-        
-        question_lower = question.lower()
-        return any(keyword in question_lower for keyword in web_search_keywords)
+        return self._web_search_re.search(question) is not None
     
     def get_web_context(self, question: str) -> str:
         """Get relevant web context for the query with plain text formatting"""
@@ -232,48 +350,126 @@ class LegalChatbot:
         except Exception as e:
             return f"Error retrieving web information: {str(e)}"
     
+    async def aget_web_context(self, question: str) -> str:
+        """Get web context without blocking the event loop"""
+        # The DuckDuckGo search is synchronous and scraping runs its own event loop
+        # via asyncio.run, so run the whole search in a worker thread
+        return await asyncio.to_thread(self.get_web_context, question)
+    
+    def _legal_refs(self, question: str) -> frozenset:
+        """Return the provision numbers and names a question refers to"""
+        return frozenset(ref.lower() for ref in _LEGAL_REF_RE.findall(question))
+    
+    def _semantic_cache_lookup(self, question: str, query_embedding: List[float]):
+        """Return the cached answer for a near-duplicate question, if any"""
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        refs = self._legal_refs(question)
+        now = time.monotonic()
+        with self._sem_cache_lock:
+            self._sem_cache = [entry for entry in self._sem_cache if entry[2] > now]
+            if not self._sem_cache:
+                return None
+            similarities = np.stack([entry[0] for entry in self._sem_cache]) @ query_vector
+            for i in np.argsort(-similarities):
+                if similarities[i] < SEMANTIC_CACHE_THRESHOLD:
+                    break
+                if self._sem_cache[i][1] == refs:
+                    # Mark as most recently used
+                    entry = self._sem_cache.pop(i)
+                    self._sem_cache.append(entry)
+                    return entry[3]
+            return None
+    
+    def _semantic_cache_store(self, question: str, query_embedding: List[float], answer: str, generation: int):
+        """Remember an answer, evicting the least recently used entry when full"""
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        entry = (query_vector, self._legal_refs(question), time.monotonic() + SEMANTIC_CACHE_TTL, answer)
+        with self._sem_cache_lock:
+            # The index was rebuilt while this answer was being generated
+            if generation != self._index_generation:
+                return
+            self._sem_cache.append(entry)
+            if len(self._sem_cache) > SEMANTIC_CACHE_SIZE:
+                self._sem_cache.pop(0)
+    
     def query(self, question: str) -> str:
         """Enhanced query method with web search integration and improved formatting"""
+        return "".join(self.query_stream(question))
+    
+    def query_stream(self, question: str) -> Iterator[str]:
+        """Answer a question, yielding the response text as the LLM generates it"""
         if not self.query_engine:
             raise ValueError("Query engine not setup. Call setup_query_engine() first.")
         
         try:
-            # Get context from document index (reduced similarity search)
-            retriever = VectorIndexRetriever(index=self.index, similarity_top_k=3)
-            nodes = retriever.retrieve(question)
-            doc_context = "\n".join([node.node.text for node in nodes])
-            
-            # Check if web search is needed
-            web_context = ""
-            if self.should_search_web(question):
-                print("🔍 Searching web for recent information...")
-                web_context = self.get_web_context(question)
-            else:
-                web_context = "No web search performed - using statutory documents only."
+            # Read before the retriever is used, so a rebuild that swaps the
+            # index mid-query always shows up as a changed generation
+            generation = self._index_generation
+            query_embedding, cached_answer, enhanced_prompt, used_web = asyncio.run(self._aprepare_query(question))
+            if cached_answer is not None:
+                yield cached_answer
+                return
             
-            # Create enhanced prompt
-            enhanced_prompt = self.legal_prompt_template.format(
-                context_str=doc_context,
-                web_context=web_context,
-                query_str=question
-            )
-            
-            # Query the LLM directly with enhanced context
-            response = self.llm.complete(enhanced_prompt)
-            
-            # Clean up response formatting
-            response_text = str(response)
-            # Remove markdown formatting
-            response_text = response_text.replace('**', '')
-            response_text = response_text.replace('*', '')
-            response_text = response_text.replace('###', '')
-            response_text = response_text.replace('##', '')
-            response_text = response_text.replace('#', '')
+            parts = []
+            for chunk in self.llm.stream_complete(enhanced_prompt):
+                # The markdown pattern matches single characters, so stripping
+                # each delta gives the same text as stripping the whole answer
+                delta = _MD_RE.sub('', chunk.delta or '')
+                if delta:
+                    parts.append(delta)
+                    yield delta
             
-            return response_text
+            # Web results go stale, so only answers from the documents are reused
+            answer = "".join(parts)
+            if not used_web and answer.strip():
+                self._semantic_cache_store(question, query_embedding, answer, generation)
             
         except Exception as e:
-            return f"Error processing query: {str(e)}"
+            yield f"Error processing query: {str(e)}"
+    
+    async def _aprepare_query(self, question: str):
+        """Return the question embedding, a cached answer or the LLM prompt, and whether web search was used"""
+        # Embed the question once; reused for the cache lookup and retrieval.
+        # Sync calls in worker threads keep the shared async clients off this
+        # per-query event loop
+        query_embedding = await asyncio.to_thread(self.embed_model.get_query_embedding, question)
+        
+        # Questions asking for recent information always get a fresh web search,
+        # so they never read the cache, which only holds document-only answers
+        used_web = self.should_search_web(question)
+        if not used_web:
+            cached_answer = self._semantic_cache_lookup(question, query_embedding)
+            if cached_answer is not None:
+                print("⚡ Answered from semantic cache")
+                return query_embedding, cached_answer, None, False
+        query_bundle = QueryBundle(query_str=question, embedding=query_embedding)
+        
+        # Get context from the document index; if web search is needed, run it alongside
+        if used_web:
+            print("🔍 Searching web for recent information...")
+            nodes, web_context = await asyncio.gather(
+                asyncio.to_thread(self.retriever.retrieve, query_bundle),
+                self.aget_web_context(question)
+            )
+        else:
+            nodes = await asyncio.to_thread(self.retriever.retrieve, query_bundle)
+            web_context = "No web search performed - using statutory documents only."
+        
+        # Bound the prompt size; LLM latency and cost grow with input tokens
+        doc_context = "\n".join(node.node.text[:DOC_CONTEXT_NODE_CHARS] for node in nodes)[:DOC_CONTEXT_MAX_CHARS]
+        
+        # Create enhanced prompt
+        enhanced_prompt = self.legal_prompt_template.format(
+            context_str=doc_context,
+            web_context=web_context,
+            query_str=question
+        )
+        prompt_tokens = len(Settings.tokenizer(enhanced_prompt))
+        if prompt_tokens > PROMPT_TOKEN_WARN:
+            print(f"⚠️ Large prompt: {prompt_tokens} tokens")
+        return query_embedding, None, enhanced_prompt, used_web
     
     def initialize(self, force_rebuild: bool = False):
         """Initialize the complete chatbot system with faster startup"""
@@ -284,21 +480,33 @@ class LegalChatbot:
     
     def rebuild_index(self):
         """Force rebuild the index (useful when documents are updated)"""
-        print("🔄 Rebuilding index...")
-        self.initialize(force_rebuild=True)
+        with self._rebuild_lock:
+            print("🔄 Rebuilding index...")
+            # Other sessions keep querying the old index until the new one is ready
+            self.index = self._load_or_build_index(force_rebuild=True)
+            self.setup_query_engine()
+            # Cached answers may be based on the old documents
+            with self._sem_cache_lock:
+                self._index_generation += 1
+                self._sem_cache = []
     
     def get_document_info(self):
         """Get information about loaded documents"""
         if not self.index:
             return "Index not built yet."
         
-        doc_info = []
-        for doc_id in self.index.docstore.docs:
-            doc = self.index.docstore.get_document(doc_id)
-            doc_info.append({
+        # docs is already the id -> document mapping, so no per-id lookup is needed
+        return [
+            {
                 "filename": doc.metadata.get("filename", "Unknown"),
                 "document_type": doc.metadata.get("document_type", "Unknown"),
                 "text_length": len(doc.text)
-            })
-        
-        return doc_info
\ No newline at end of file
+            }
+            for doc in self.index.docstore.docs.values()
+        ]
+
+
+if __name__ == "__main__":
+    # Pre-warm the persisted index before launching the Streamlit app so the
+    # first session loads from cache instead of building it
+    LegalChatbot().initialize()
\ No newline at end of file
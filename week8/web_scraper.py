@@ -1,22 +1,49 @@
 import requests
+import asyncio
+import aiohttp
+import diskcache
 from bs4 import BeautifulSoup
-from googlesearch import search
-import time
+from duckduckgo_search import DDGS
 import random
 from typing import List, Dict
-from fake_useragent import UserAgent
 import re
 from urllib.parse import urljoin, urlparse
 import logging
 
+# Runs of whitespace collapsed when cleaning scraped text
+_WS_RE = re.compile(r'\s+')
+
+# How long search results and scraped pages stay cached, in seconds
+WEB_CACHE_TTL = 24 * 60 * 60
+
+# Concurrent requests allowed against a single host
+MAX_REQUESTS_PER_DOMAIN = 2
+# Most pages fetched for one case-law search across all of its sub-queries
+CASE_LAW_MAX_FETCHES = 8
+
+# Desktop browser user agents; one is picked per scraper instance
+_UA_POOL = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:127.0) Gecko/20100101 Firefox/127.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
+)
+
+
+def compile_keywords(keywords: List[str]) -> re.Pattern:
+    """Compile keywords into one case-insensitive regex matching at word starts"""
+    # Only the leading boundary is anchored so plurals like "judgments" still match
+    return re.compile(r'\b(?:' + '|'.join(re.escape(keyword) for keyword in keywords) + ')', re.IGNORECASE)
+
+
 class WebScraper:
     """Web scraper for legal information and recent cases"""
     
     def __init__(self):
-        self.ua = UserAgent()
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': self.ua.random,
+            'User-Agent': random.choice(_UA_POOL),
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
             'Accept-Encoding': 'gzip, deflate',
@@ -34,6 +61,17 @@ class WebScraper:
             'legally.co.in',
             'taxguru.in'
         ]
+        # A host is trusted if it is a listed domain or one of its subdomains
+        self._trusted_hosts = frozenset(self.trusted_sources)
+        self._trusted_suffixes = tuple('.' + source for source in self.trusted_sources)
+        
+        # Keyword matchers used by detect_query_type
+        self._recent_re = compile_keywords(['recent', 'latest', 'new', '2024', '2023', 'current', 'today'])
+        self._case_re = compile_keywords(['case', 'judgment', 'ruling', 'decision', 'precedent'])
+        self._definition_re = compile_keywords(['what is', 'define', 'definition', 'meaning', 'explain'])
+        
+        # On-disk cache of search results and scraped pages, shared across sessions
+        self.cache = diskcache.Cache('./web_cache', size_limit=int(1e9))
         
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
@@ -41,115 +79,148 @@ class WebScraper:
     def is_trusted_source(self, url: str) -> bool:
         """Check if URL is from a trusted legal source"""
         try:
-            domain = urlparse(url).netloc.lower()
-            return any(source in domain for source in self.trusted_sources)
+            host = urlparse(url).hostname or ''
+            return host in self._trusted_hosts or host.endswith(self._trusted_suffixes)
         except:
             return False
     
-    def google_search_legal(self, query: str, num_results: int = 5) -> List[str]:
-        """Search Google for legal information with Indian law focus"""
+    def web_search_legal(self, query: str, num_results: int = 5) -> List[str]:
+        """Search DuckDuckGo for legal information with Indian law focus"""
         try:
             # Add Indian legal context to query
             enhanced_query = f"{query} India law judgment case site:indiankanoon.org OR site:livelaw.in OR site:barandbench.com"
             
             urls = []
-            search_results = search(enhanced_query, num_results=num_results * 2, stop=num_results * 2, pause=2)
-            
-            for url in search_results:
-                if self.is_trusted_source(url):
-                    urls.append(url)
-                    if len(urls) >= num_results:
-                        break
-                        
-            # If not enough trusted sources, search more broadly
-            if len(urls) < 3:
-                broader_query = f"{query} Supreme Court India High Court judgment 2024 2023"
-                broader_results = search(broader_query, num_results=10, stop=10, pause=2)
-                
-                for url in broader_results:
-                    if url not in urls and len(urls) < num_results:
+            with DDGS() as ddgs:
+                for result in ddgs.text(enhanced_query, region='in-en', max_results=num_results * 2):
+                    url = result['href']
+                    if self.is_trusted_source(url):
                         urls.append(url)
+                        if len(urls) >= num_results:
+                            break
+                
+                # If not enough trusted sources, search more broadly
+                if len(urls) < 3:
+                    broader_query = f"{query} Supreme Court India High Court judgment 2024 2023"
+                    for result in ddgs.text(broader_query, region='in-en', max_results=10):
+                        url = result['href']
+                        if url not in urls and len(urls) < num_results:
+                            urls.append(url)
             
             return urls[:num_results]
             
         except Exception as e:
-            self.logger.error(f"Google search error: {str(e)}")
+            self.logger.error(f"Web search error: {str(e)}")
             return []
     
+    def _parse_html(self, url: str, html: bytes) -> Dict:
+        """Extract title and main content from a fetched page"""
+        soup = BeautifulSoup(html, 'lxml')
+        
+        # Remove script and style elements
+        for script in soup(["script", "style", "nav", "footer", "header", "sidebar"]):
+            script.decompose()
+        
+        # Extract title
+        title = soup.find('title')
+        title_text = title.get_text().strip() if title else "No title"
+        
+        # Extract main content
+        content_selectors = [
+            'article', 'main', '.content', '.post-content', 
+            '.judgment-text', '.case-content', '.legal-content',
+            'div[class*="content"]', 'div[class*="article"]'
+        ]
+        
+        content_text = ""
+        for selector in content_selectors:
+            content_elem = soup.select_one(selector)
+            if content_elem:
+                content_text = content_elem.get_text(separator=' ', strip=True)
+                break
+        
+        # If no specific content found, get body text
+        if not content_text:
+            content_text = soup.get_text(separator=' ', strip=True)
+        
+        # Clean up text; trim first so long pages are not normalized in full
+        content_text = _WS_RE.sub(' ', content_text[:6000])[:3000]  # Limit content length
+        
+        return {
+            'url': url,
+            'title': title_text,
+            'content': content_text,
+            'source': urlparse(url).netloc
+        }
+    
+    def _error_result(self, url: str) -> Dict:
+        """Placeholder result for a page that could not be loaded"""
+        return {
+            'url': url,
+            'title': 'Error loading page',
+            'content': 'Could not extract content from this page',
+            'source': urlparse(url).netloc if url else 'unknown'
+        }
+    
     def extract_text_from_url(self, url: str) -> Dict:
         """Extract relevant text content from a URL"""
+        return asyncio.run(self._fetch_all([url]))[0]
+    
+    async def _fetch(self, session: aiohttp.ClientSession, url: str, domain_limits: Dict) -> Dict:
+        """Asynchronously fetch a URL and extract its content"""
+        cached = self.cache.get(('page', url))
+        if cached is not None:
+            return cached
+        
+        domain = urlparse(url).netloc
+        semaphore = domain_limits.setdefault(domain, asyncio.Semaphore(MAX_REQUESTS_PER_DOMAIN))
         try:
-            # Random delay to avoid being blocked
-            time.sleep(random.uniform(1, 3))
-            
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style", "nav", "footer", "header", "sidebar"]):
-                script.decompose()
-            
-            # Extract title
-            title = soup.find('title')
-            title_text = title.get_text().strip() if title else "No title"
-            
-            # Extract main content
-            content_selectors = [
-                'article', 'main', '.content', '.post-content', 
-                '.judgment-text', '.case-content', '.legal-content',
-                'div[class*="content"]', 'div[class*="article"]'
-            ]
-            
-            content_text = ""
-            for selector in content_selectors:
-                content_elem = soup.select_one(selector)
-                if content_elem:
-                    content_text = content_elem.get_text(separator=' ', strip=True)
-                    break
-            
-            # If no specific content found, get body text
-            if not content_text:
-                content_text = soup.get_text(separator=' ', strip=True)
-            
-            # Clean up text
-            content_text = re.sub(r'\s+', ' ', content_text)
-            content_text = content_text[:3000]  # Limit content length
+            async with semaphore:
+                # Random delay to avoid being blocked
+                await asyncio.sleep(random.uniform(1, 3))
+                
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    response.raise_for_status()
+                    html = await response.read()
             
-            return {
-                'url': url,
-                'title': title_text,
-                'content': content_text,
-                'source': urlparse(url).netloc
-            }
+            result = self._parse_html(url, html)
+            self.cache.set(('page', url), result, expire=WEB_CACHE_TTL)
+            return result
             
         except Exception as e:
             self.logger.error(f"Error extracting from {url}: {str(e)}")
-            return {
-                'url': url,
-                'title': 'Error loading page',
-                'content': 'Could not extract content from this page',
-                'source': urlparse(url).netloc if url else 'unknown'
-            }
+            return self._error_result(url)
     
-    def search_recent_cases(self, query: str) -> List[Dict]:
+    async def _fetch_all(self, urls: List[str]) -> List[Dict]:
+        """Fetch all URLs concurrently, limiting parallel requests per domain"""
+        domain_limits = {}
+        async with aiohttp.ClientSession(headers=dict(self.session.headers)) as session:
+            return await asyncio.gather(*(self._fetch(session, url, domain_limits) for url in urls))
+    
+    def search_recent_cases(self, query: str, num_results: int = 5) -> List[Dict]:
         """Search for recent legal cases and information"""
+        cache_key = ('search_recent_cases', query, num_results)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         self.logger.info(f"Searching for recent cases: {query}")
         
-        # Get URLs from Google search
-        urls = self.google_search_legal(query, num_results=5)
+        # Get URLs from web search
+        urls = self.web_search_legal(query, num_results=num_results)
         
         if not urls:
             return []
         
-        # Extract content from URLs
+        # Extract content from all URLs concurrently
         results = []
-        for url in urls:
-            content_data = self.extract_text_from_url(url)
+        for content_data in asyncio.run(self._fetch_all(urls)):
             if content_data['content'] and len(content_data['content']) > 100:
                 results.append(content_data)
         
+        # Only cache successful searches so a transient failure is retried
+        if results:
+            self.cache.set(cache_key, results, expire=WEB_CACHE_TTL)
         return results
     
     def search_legal_definition(self, term: str) -> List[Dict]:
@@ -165,36 +236,41 @@ class WebScraper:
             f"{case_name_or_topic} legal precedent India"
         ]
         
-        all_results = []
-        for query in queries:
-            results = self.search_recent_cases(query)
-            all_results.extend(results)
-            if len(all_results) >= 5:
-                break
+        cache_key = ('search_case_law', case_name_or_topic)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Remove duplicates based on URL
-        unique_results = []
+        # Run the sub-queries one at a time, stopping once there are enough
+        # results. They overlap heavily, so each page is fetched only once
+        results = []
         seen_urls = set()
-        for result in all_results:
-            if result['url'] not in seen_urls:
-                unique_results.append(result)
-                seen_urls.add(result['url'])
+        for query in queries:
+            urls = [url for url in self.web_search_legal(query) if url not in seen_urls]
+            urls = urls[:CASE_LAW_MAX_FETCHES - len(seen_urls)]
+            seen_urls.update(urls)
+            
+            if urls:
+                for content_data in asyncio.run(self._fetch_all(urls)):
+                    if content_data['content'] and len(content_data['content']) > 100:
+                        results.append(content_data)
+            
+            if len(results) >= 5 or len(seen_urls) >= CASE_LAW_MAX_FETCHES:
+                break
+        results = results[:5]
         
-        return unique_results[:5]
+        # Only cache successful searches so a transient failure is retried
+        if results:
+            self.cache.set(cache_key, results, expire=WEB_CACHE_TTL)
+        return results
     
     def detect_query_type(self, query: str) -> str:
         """Detect the type of legal query to optimize search"""
-        query_lower = query.lower()
-        
-        recent_keywords = ['recent', 'latest', 'new', '2024', '2023', 'current', 'today']
-        case_keywords = ['case', 'judgment', 'ruling', 'decision', 'precedent']
-        definition_keywords = ['what is', 'define', 'definition', 'meaning', 'explain']
-        
-        if any(keyword in query_lower for keyword in recent_keywords):
+        if self._recent_re.search(query):
             return 'recent'
-        elif any(keyword in query_lower for keyword in case_keywords):
+        elif self._case_re.search(query):
             return 'case_law'
-        elif any(keyword in query_lower for keyword in definition_keywords):
+        elif self._definition_re.search(query):
             return 'definition'
         else:
             return 'general'